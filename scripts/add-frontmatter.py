@@ -1,13 +1,21 @@
 #!/usr/bin/env python3
 """Add YAML front matter to documentation files."""
 
+import codecs
+import mmap
 import os
 import re
+import shutil
+import stat
+import sys
+from concurrent.futures import CancelledError, ProcessPoolExecutor
+from itertools import repeat
 from pathlib import Path
 from datetime import date
+from functools import lru_cache
 
-# Standard tags vocabulary
-STANDARD_TAGS = {
+# Standard tags vocabulary, interned so every use shares one string object
+STANDARD_TAGS = frozenset(map(sys.intern, {
     # Audience
     'user', 'developer', 'architect', 'devops', 'admin',
     # Topic
@@ -18,7 +26,59 @@ STANDARD_TAGS = {
     'dm', 'search', 'calendar', 'zones', 'pwa',
     # Specific
     'architecture', 'adr', 'ddd', 'documentation'
+}))
+
+# Pre-compiled patterns used for every processed file
+_H1_RE = re.compile(r'^#\s+(.+)$', re.MULTILINE)
+_DESC_RE = re.compile(r'\A(?:#[^\n]*\n+)?([^\n].*?)(?:\n\n|\n##|\Z)', re.DOTALL)
+_WS_RE = re.compile(r'\s+')
+
+# Bytes read from the start of each file for title/description extraction
+_HEAD_SIZE = 8192
+
+# Bytes read to detect an existing front matter fence, with room for
+# trailing whitespace after the '---'
+_SENTINEL_SIZE = 64
+
+# Directories never descended into (hidden directories are skipped too)
+_SKIP_DIRS = frozenset({'node_modules', '__pycache__', 'dist', 'build'})
+
+# Files larger than this are memory-mapped instead of read
+_MMAP_THRESHOLD = 1 << 16
+
+# Progress lines buffered before each write to stdout
+_PROGRESS_BATCH = 100
+
+# Path keyword -> tag. The lookahead makes findall() report overlapping
+# matches (e.g. 'dm' inside 'admin'), mirroring independent substring tests.
+_PATH_TAG_KEYWORDS = {
+    # Audience ('dev' also covers 'developer')
+    'user': 'user', 'dev': 'developer', 'admin': 'admin',
+    # Topic
+    'nostr': 'nostr', 'auth': 'authentication', 'message': 'messaging',
+    'dm': 'messaging', 'channel': 'channels', 'chat': 'channels',
+    'security': 'security', 'deploy': 'deployment',
+    # Type
+    'adr': 'adr', 'architecture': 'architecture', 'ddd': 'ddd',
+    'guide': 'guide', 'reference': 'reference', 'api': 'reference',
+    # Feature
+    'calendar': 'calendar', 'event': 'calendar', 'search': 'search',
+    'zone': 'zones', 'pwa': 'pwa',
 }
+_PATH_TAG_RE = re.compile('(?=(%s))' % '|'.join(map(re.escape, _PATH_TAG_KEYWORDS)))
+
+# Ordered (keywords, category) rules; the first rule with a hit wins
+_CATEGORY_RULES = (
+    (frozenset({'tutorial', 'getting-started'}), 'tutorial'),
+    (frozenset({'howto', 'guide'}), 'howto'),
+    (frozenset({'reference', 'api', 'adr'}), 'reference'),
+    (frozenset({'explanation', 'architecture', 'ddd'}), 'explanation'),
+    (frozenset({'user'}), 'tutorial'),
+    (frozenset({'developer'}), 'reference'),
+)
+_CATEGORY_RE = re.compile(
+    '(?=(%s))' % '|'.join(re.escape(kw) for keywords, _ in _CATEGORY_RULES for kw in keywords)
+)
 
 # File-specific metadata mappings
 METADATA_MAP = {
@@ -80,88 +140,46 @@ METADATA_MAP = {
     },
 }
 
-def has_frontmatter(filepath):
-    """Check if file already has YAML front matter."""
-    with open(filepath, 'r', encoding='utf-8') as f:
-        first_line = f.readline()
-    return first_line.strip() == '---'
-
 def extract_title_from_heading(content):
     """Extract title from first H1 heading."""
-    match = re.search(r'^#\s+(.+)$', content, re.MULTILINE)
+    match = _H1_RE.search(content)
     return match.group(1).strip() if match else None
 
-def infer_category(filepath):
-    """Infer Diataxis category from file path and content."""
-    path_str = str(filepath).lower()
-
-    # Path-based inference
-    if 'tutorial' in path_str or 'getting-started' in path_str:
-        return 'tutorial'
-    if 'howto' in path_str or 'guide' in path_str:
-        return 'howto'
-    if 'reference' in path_str or 'api' in path_str or 'adr' in path_str:
-        return 'reference'
-    if 'explanation' in path_str or 'architecture' in path_str or 'ddd' in path_str:
-        return 'explanation'
-
-    # Default based on audience
-    if 'user' in path_str:
-        return 'tutorial'
-    if 'developer' in path_str:
-        return 'reference'
+def infer_category(path_str):
+    """Infer Diataxis category from a lowercased file path."""
+    hits = set(_CATEGORY_RE.findall(path_str))
+
+    # Path-based inference first, then defaults based on audience
+    for keywords, category in _CATEGORY_RULES:
+        if hits & keywords:
+            return category
 
     return 'reference'
 
-def infer_tags(filepath, title):
-    """Infer tags from file path and title."""
-    tags = set()
-    path_str = str(filepath).lower()
-    title_lower = title.lower() if title else ''
-
-    # Audience tags
-    if 'user' in path_str:
-        tags.add('user')
-    if 'developer' in path_str or 'dev' in path_str:
-        tags.add('developer')
-    if 'admin' in path_str:
-        tags.add('admin')
-
-    # Topic tags
-    if 'nostr' in path_str or 'nostr' in title_lower:
+@lru_cache(maxsize=256)
+def _infer_tags_from_path(path_str):
+    """Infer tags from a lowercased path fragment."""
+    return frozenset(_PATH_TAG_KEYWORDS[kw] for kw in _PATH_TAG_RE.findall(path_str))
+
+def infer_tags(path_str, title_lower):
+    """Infer tags from a lowercased file path and title."""
+    # None of the keywords contain a separator, so directory and file name
+    # can be probed separately; sibling files then share the cached result
+    dir_str, _, name = path_str.rpartition(os.sep)
+    tags = set(_infer_tags_from_path(dir_str))
+    tags |= _infer_tags_from_path(name)
+
+    # Title-based tags
+    if 'nostr' in title_lower:
         tags.add('nostr')
-    if 'auth' in path_str or 'auth' in title_lower:
+    if 'auth' in title_lower:
         tags.add('authentication')
-    if 'message' in path_str or 'dm' in path_str:
-        tags.add('messaging')
-    if 'channel' in path_str or 'chat' in path_str:
-        tags.add('channels')
-    if 'security' in path_str or 'security' in title_lower:
+    if 'security' in title_lower:
         tags.add('security')
-    if 'deploy' in path_str:
-        tags.add('deployment')
-
-    # Type tags
-    if 'adr' in path_str:
-        tags.add('adr')
-    if 'architecture' in path_str or 'architecture' in title_lower:
+    if 'architecture' in title_lower:
         tags.add('architecture')
-    if 'ddd' in path_str:
-        tags.add('ddd')
-    if 'guide' in path_str or 'guide' in title_lower:
+    if 'guide' in title_lower:
         tags.add('guide')
-    if 'reference' in path_str or 'api' in path_str:
-        tags.add('reference')
-
-    # Feature tags
-    if 'calendar' in path_str or 'event' in path_str:
-        tags.add('calendar')
-    if 'search' in path_str:
-        tags.add('search')
-    if 'zone' in path_str:
-        tags.add('zones')
-    if 'pwa' in path_str:
-        tags.add('pwa')
 
     # Ensure at least 2 tags
     if len(tags) == 0:
@@ -169,12 +187,10 @@ def infer_tags(filepath, title):
     if len(tags) == 1:
         tags.add('guide')
 
-    return sorted(list(tags))
-
-def infer_difficulty(filepath):
-    """Infer difficulty level from file path."""
-    path_str = str(filepath).lower()
+    return sorted(tags)
 
+def infer_difficulty(path_str):
+    """Infer difficulty level from a lowercased file path."""
     if 'user' in path_str or 'getting-started' in path_str:
         return 'beginner'
     if 'adr' in path_str or 'architecture' in path_str or 'ddd' in path_str:
@@ -184,77 +200,221 @@ def infer_difficulty(filepath):
 
     return None  # Optional field
 
-def create_frontmatter(filepath, content):
-    """Create YAML front matter for a file."""
-    relative_path = str(filepath).replace('/home/devuser/workspace/project2/docs/', '')
+def _infer_all(path_str, title_lower):
+    """Infer (category, tags, difficulty) from a lowercased path and title."""
+    return (
+        infer_category(path_str),
+        infer_tags(path_str, title_lower),
+        infer_difficulty(path_str),
+    )
+
+def _render_frontmatter_fields(title, description, category, tags, difficulty):
+    """Render every front matter line that does not depend on the run date."""
+    # Build in one pass; tags are written as a YAML flow sequence in the
+    # same single-quoted form the docs tree already uses
+    parts = [
+        '---\n',
+        f'title: "{title}"\n',
+        f'description: "{description}"\n',
+        f'category: {category}\n',
+        'tags: [', ', '.join(f"'{tag}'" for tag in tags), ']\n',
+    ]
+    if difficulty:
+        parts.append(f'difficulty: {difficulty}\n')
 
+    return ''.join(parts)
+
+# METADATA_MAP entries only vary by date, so render them once at import
+_PRERENDERED = {
+    path: _render_frontmatter_fields(
+        meta['title'], meta['description'], meta['category'], meta['tags'], meta.get('difficulty')
+    )
+    for path, meta in METADATA_MAP.items()
+}
+
+def create_frontmatter(filepath, content, rel_str, today_iso):
+    """Create YAML front matter for a file."""
     # Check for pre-defined metadata
-    if relative_path in METADATA_MAP:
-        meta = METADATA_MAP[relative_path]
-        title = meta['title']
-        description = meta['description']
-        category = meta['category']
-        tags = meta['tags']
-        difficulty = meta.get('difficulty')
-    else:
+    fields = _PRERENDERED.get(rel_str)
+    if fields is None:
         # Extract title from content
         title = extract_title_from_heading(content)
         if not title:
             title = filepath.stem.replace('-', ' ').replace('_', ' ').title()
 
         # Generate description (first paragraph or from title)
-        desc_match = re.search(r'^(?:#.*?\n+)?(.+?)(?:\n\n|\n##)', content, re.MULTILINE | re.DOTALL)
+        desc_match = _DESC_RE.match(content)
         if desc_match:
             description = desc_match.group(1).strip()
-            description = re.sub(r'\s+', ' ', description)[:200]
+            description = _WS_RE.sub(' ', description)[:200]
         else:
             description = f"{title} documentation"
 
-        category = infer_category(filepath)
-        tags = infer_tags(filepath, title)
-        difficulty = infer_difficulty(filepath)
-
-    # Build frontmatter
-    frontmatter = f"""---
-title: "{title}"
-description: "{description}"
-category: {category}
-tags: {tags}
-"""
-
-    if difficulty:
-        frontmatter += f"difficulty: {difficulty}\n"
+        # Lowercase the path and title once for all the inference helpers
+        category, tags, difficulty = _infer_all(str(filepath).lower(), title.lower())
+        fields = _render_frontmatter_fields(title, description, category, tags, difficulty)
 
-    frontmatter += f"last-updated: {date.today().isoformat()}\n"
-    frontmatter += "---\n\n"
+    return f'{fields}last-updated: {today_iso}\n---\n\n'
 
-    return frontmatter
+def _write_with_frontmatter(filepath, rel_str, today_iso, head, body, tmp_path):
+    """Write front matter, head and the rest of body to tmp_path.
 
-def add_frontmatter_to_file(filepath):
-    """Add frontmatter to a single file."""
-    if has_frontmatter(filepath):
+    body is either the source file positioned just past head, or an mmap of
+    the whole source. Returns False if the file already has front matter.
+    """
+    # Skip files that already have YAML front matter; like a stripped first
+    # line, this tolerates surrounding whitespace and a missing newline
+    if head.split(b'\n', 1)[0].strip() == b'---':
         return False
 
-    with open(filepath, 'r', encoding='utf-8') as f:
-        content = f.read()
+    # Pre-mapped files only read enough for the fence check; extend the head
+    # (still bounded) until it reaches the first line ending
+    if b'\n' not in head and len(head) < _HEAD_SIZE:
+        if isinstance(body, mmap.mmap):
+            head = body[:_HEAD_SIZE]
+        else:
+            head += body.read(_HEAD_SIZE - len(head))
+
+    if rel_str in METADATA_MAP:
+        # Pre-mapped files take their metadata from the table, not the content
+        content = ''
+    else:
+        # Title and description only need the start of the document; the
+        # incremental decoder holds back a multi-byte char split at the cut
+        content = codecs.getincrementaldecoder('utf-8')().decode(head)
+        content = content.replace('\r\n', '\n')
+    frontmatter = create_frontmatter(filepath, content, rel_str, today_iso)
+    # The body is copied byte-for-byte rather than decoded and re-encoded,
+    # so write the front matter with the document's own line endings
+    if b'\r\n' in head:
+        frontmatter = frontmatter.replace('\n', '\r\n')
+
+    with open(tmp_path, 'wb') as dst:
+        dst.write(frontmatter.encode('utf-8'))
+        dst.write(head)
+        if isinstance(body, mmap.mmap):
+            with memoryview(body) as view:
+                dst.write(view[len(head):])
+        else:
+            shutil.copyfileobj(body, dst, 1 << 16)
 
-    frontmatter = create_frontmatter(filepath, content)
+    return True
 
-    with open(filepath, 'w', encoding='utf-8') as f:
-        f.write(frontmatter + content)
+def add_frontmatter_to_file(filepath, rel_str, today_iso):
+    """Add frontmatter to a single file.
+
+    rel_str is the POSIX path of the file relative to the docs directory.
+    """
+    # Rewrite the real document behind a symlink rather than the link itself.
+    # The pid keeps temp names distinct if two links resolve to one target.
+    target = filepath.resolve()
+    tmp_path = target.with_name(f'{target.name}.{os.getpid()}.tmp')
+    # Pre-mapped files only need enough bytes to spot existing front matter
+    head_size = _SENTINEL_SIZE if rel_str in METADATA_MAP else _HEAD_SIZE
+
+    try:
+        with open(target, 'rb') as src:
+            st = os.fstat(src.fileno())
+            if st.st_size > _MMAP_THRESHOLD:
+                # Map large files so only the pages actually touched are read,
+                # and the body is written straight from the page cache
+                with mmap.mmap(src.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+                    written = _write_with_frontmatter(
+                        filepath, rel_str, today_iso, mm[:head_size], mm, tmp_path
+                    )
+            else:
+                head = src.read(head_size)
+                written = _write_with_frontmatter(filepath, rel_str, today_iso, head, src, tmp_path)
+
+        if not written:
+            return False
+
+        # Keep the original permissions, then swap the temp file in so an
+        # interrupted run never leaves a truncated document behind
+        os.chmod(tmp_path, stat.S_IMODE(st.st_mode))
+        os.replace(tmp_path, target)
+    except BaseException:
+        tmp_path.unlink(missing_ok=True)
+        raise
 
     return True
 
+def _add_frontmatter_or_error(filepath, rel_str, today_iso):
+    """Run add_frontmatter_to_file() in a pool worker, returning any error.
+
+    Raising would discard the results of the whole chunk, including files
+    already rewritten, so main() could no longer report them.
+    """
+    try:
+        return add_frontmatter_to_file(filepath, rel_str, today_iso)
+    except Exception as exc:
+        return exc
+
+def iter_markdown_files(docs_dir):
+    """Yield markdown files under docs_dir, skipping ones too small to process."""
+    with os.scandir(docs_dir) as entries:
+        for entry in entries:
+            if entry.is_dir(follow_symlinks=False):
+                # Skip these subtrees without ever listing them
+                if not entry.name.startswith('.') and entry.name not in _SKIP_DIRS:
+                    yield from iter_markdown_files(entry.path)
+            # Size comes from stat() (one syscall, cached on the DirEntry), so
+            # tiny files are skipped without an open()
+            elif entry.name.endswith('.md') and entry.stat().st_size >= 8:
+                yield Path(entry.path)
+
 def main():
     """Process all markdown files in docs directory."""
+    # Block-buffer stdout; progress lines are written in batches below
+    sys.stdout.reconfigure(line_buffering=False, write_through=False)
+
     docs_dir = Path('/home/devuser/workspace/project2/docs')
+    today_iso = date.today().isoformat()
     updated_files = []
 
-    for md_file in docs_dir.rglob('*.md'):
-        if add_frontmatter_to_file(md_file):
-            relative_path = md_file.relative_to(docs_dir)
-            updated_files.append(str(relative_path))
-            print(f"✓ {relative_path}")
+    # Each file is independent, so fan the work out across a process pool
+    files = list(iter_markdown_files(docs_dir))
+    rel_paths = [md_file.relative_to(docs_dir).as_posix() for md_file in files]
+    batch = []
+    failed = None
+    try:
+        with ProcessPoolExecutor(max_workers=os.cpu_count()) as executor:
+            # Consume results as they arrive so each batch is reported promptly
+            results = executor.map(
+                _add_frontmatter_or_error, files, rel_paths, repeat(today_iso), chunksize=16
+            )
+            try:
+                for rel_str, result in zip(rel_paths, results):
+                    if isinstance(result, Exception):
+                        # Stop queued chunks from rewriting more files, but
+                        # keep reporting the ones that already finished
+                        if failed is None:
+                            failed = (rel_str, result)
+                            executor.shutdown(wait=False, cancel_futures=True)
+                        continue
+                    if result:
+                        updated_files.append(rel_str)
+                        batch.append(f"✓ {rel_str}")
+                        if len(batch) >= _PROGRESS_BATCH:
+                            sys.stdout.write('\n'.join(batch) + '\n')
+                            sys.stdout.flush()
+                            batch.clear()
+            except CancelledError:
+                # Reached the chunks cancelled after the first failure
+                if failed is None:
+                    raise
+            except BaseException:
+                executor.shutdown(wait=False, cancel_futures=True)
+                raise
+    finally:
+        # Always report what was changed, even if a file failed
+        if batch:
+            sys.stdout.write('\n'.join(batch) + '\n')
+        sys.stdout.flush()
+
+    if failed is not None:
+        rel_str, error = failed
+        raise RuntimeError(f"Failed to add front matter to {rel_str}") from error
 
     print(f"\n\nUpdated {len(updated_files)} files")
 
@@ -263,5 +423,7 @@ def main():
         for f in sorted(updated_files):
             print(f"  - {f}")
 
+    sys.stdout.flush()
+
 if __name__ == '__main__':
     main()